@@ -0,0 +1,32 @@
+-- =============================================================
+-- MS-GEO-PY - Índices de ciudades y zonas
+-- Equivalente a los __table_args__ de src/models/city.py y zone.py
+--
+-- Aplicar sobre bases de datos existentes (PostgreSQL):
+--   psql "$DATABASE_URL" -f migrations/001_geo_indexes.sql
+-- =============================================================
+
+-- 1. Revisar zonas duplicadas en una misma ciudad.
+--    El índice único no se puede construir mientras existan.
+SELECT city_id, name, array_agg(id ORDER BY id) AS zone_ids
+FROM zones
+GROUP BY city_id, name
+HAVING count(*) > 1;
+
+-- 2. Eliminar los duplicados conservando la zona con el ID más bajo.
+--    Antes de ejecutarlo, verificar que ningún otro servicio
+--    referencia los IDs que se van a borrar (ver consulta anterior).
+BEGIN;
+
+DELETE FROM zones AS duplicate
+USING zones AS original
+WHERE duplicate.city_id = original.city_id
+  AND duplicate.name = original.name
+  AND duplicate.id > original.id;
+
+-- 3. Crear los índices. create_zone usa ON CONFLICT sobre (city_id, name).
+CREATE UNIQUE INDEX IF NOT EXISTS ix_zones_city_name ON zones (city_id, name);
+CREATE INDEX IF NOT EXISTS ix_zones_active ON zones (is_active) WHERE is_active;
+CREATE INDEX IF NOT EXISTS ix_cities_active ON cities (is_active) WHERE is_active;
+
+COMMIT;
@@ -2,12 +2,42 @@
 MS-GEO-PY - Microservicio Geográfico
 FastAPI Application
 """
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, RedirectResponse
+from pydantic import BaseModel
 
 from .config import settings
+from .models import engine
 from .routers import geo_router
+from . import schemas
+
+# Logger integrado con la configuración de logging de uvicorn
+logger = logging.getLogger("uvicorn.error")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Ciclo de vida de la aplicación: inicio y cierre"""
+    # Los schemas usan defer_build: se construyen una sola vez aquí
+    for schema_name in schemas.__all__:
+        schema = getattr(schemas, schema_name)
+        if isinstance(schema, type) and issubclass(schema, BaseModel):
+            schema.model_rebuild()
+    
+    logger.info("🚀 %s v%s iniciado", settings.APP_NAME, settings.APP_VERSION)
+    logger.info("📚 Documentación disponible en: http://%s:%s/docs", settings.SERVICE_HOST, settings.SERVICE_PORT)
+    logger.info("🗺️  Endpoints geográficos en: %s", settings.API_PREFIX)
+    
+    yield
+    
+    # Cerrar las conexiones del pool
+    await engine.dispose()
+    logger.info("🛑 %s detenido", settings.APP_NAME)
 
 # Crear aplicación FastAPI
 app = FastAPI(
@@ -29,7 +59,9 @@ app = FastAPI(
     """,
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -41,6 +73,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Comprimir respuestas (listados de ciudades y zonas)
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=5)
+
 # Incluir routers
 app.include_router(
     geo_router,
@@ -65,21 +100,6 @@ async def root_health():
     }
 
 
-# Event handlers
-@app.on_event("startup")
-async def startup_event():
-    """Evento de inicio de la aplicación"""
-    print(f"🚀 {settings.APP_NAME} v{settings.APP_VERSION} iniciado")
-    print(f"📚 Documentación disponible en: http://{settings.SERVICE_HOST}:{settings.SERVICE_PORT}/docs")
-    print(f"🗺️  Endpoints geográficos en: {settings.API_PREFIX}")
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Evento de cierre de la aplicación"""
-    print(f"🛑 {settings.APP_NAME} detenido")
-
-
 if __name__ == "__main__":
     import uvicorn
     
@@ -87,6 +107,9 @@ if __name__ == "__main__":
         "main:app",
         host=settings.SERVICE_HOST,
         port=settings.SERVICE_PORT,
-        reload=settings.DEBUG
+        reload=settings.DEBUG,
+        loop="uvloop",
+        http="httptools",
+        workers=settings.WORKERS
     )
 
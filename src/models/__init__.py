@@ -1,9 +1,9 @@
 """
 Modelos de la base de datos
 """
-from .database import Base, get_db, engine
+from .database import Base, get_db, engine, SessionLocal
 from .city import City
 from .zone import Zone
 
-__all__ = ["Base", "get_db", "engine", "City", "Zone"]
+__all__ = ["Base", "get_db", "engine", "SessionLocal", "City", "Zone"]
 
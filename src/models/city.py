@@ -1,7 +1,7 @@
 """
 Modelo de Ciudad
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .database import Base
@@ -11,6 +11,12 @@ class City(Base):
     """Modelo de Ciudad"""
     
     __tablename__ = "cities"
+    # Obtener valores generados por el servidor con RETURNING (sin SELECT extra)
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        # Índice parcial: solo ciudades activas
+        Index("ix_cities_active", "is_active", postgresql_where=text("is_active")),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), unique=True, nullable=False, index=True)
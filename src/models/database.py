@@ -1,36 +1,51 @@
 """
 Configuración de la base de datos
 """
-from sqlalchemy import create_engine
+from typing import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from ..config import settings
 
-# Crear engine de SQLAlchemy
-engine = create_engine(
+# Configuración del pool de conexiones
+if settings.DB_USE_PGBOUNCER:
+    # PgBouncer ya reutiliza las conexiones; no mantener un pool propio.
+    # En modo transacción no se pueden reutilizar sentencias preparadas de asyncpg.
+    pool_options = {
+        "poolclass": NullPool,
+        "connect_args": {"statement_cache_size": 0, "prepared_statement_cache_size": 0},
+    }
+else:
+    pool_options = {
+        "pool_pre_ping": True,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_use_lifo": True,  # Reutilizar primero las conexiones más recientes
+    }
+
+# Crear engine asíncrono de SQLAlchemy (driver asyncpg)
+engine = create_async_engine(
     settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
+    query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+    **pool_options
 )
 
 # Crear SessionLocal
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 
 # Base para modelos
 Base = declarative_base()
 
 
-def get_db():
+async def get_db() -> AsyncIterator[AsyncSession]:
     """
     Dependency para obtener sesión de base de datos
     
     Yields:
-        Session: Sesión de SQLAlchemy
+        AsyncSession: Sesión asíncrona de SQLAlchemy
     """
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
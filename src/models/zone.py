@@ -1,7 +1,7 @@
 """
 Modelo de Zona
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .database import Base
@@ -11,6 +11,14 @@ class Zone(Base):
     """Modelo de Zona - Áreas dentro de una ciudad"""
     
     __tablename__ = "zones"
+    # Obtener valores generados por el servidor con RETURNING (sin SELECT extra)
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        # Una zona no se repite dentro de la misma ciudad
+        Index("ix_zones_city_name", "city_id", "name", unique=True),
+        # Índice parcial: solo zonas activas
+        Index("ix_zones_active", "is_active", postgresql_where=text("is_active")),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False, index=True)
@@ -2,10 +2,14 @@
 Router Geográfico
 Endpoints: /cities, /zones, /coordinates
 """
+from cachetools import TTLCache
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-from typing import List, Optional
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only, selectinload
+from sqlalchemy import literal, select
+from typing import AsyncIterable, AsyncIterator, List, Optional
 
 from ..models import get_db, City, Zone
 from ..schemas import (
@@ -19,13 +23,60 @@ from ..schemas import (
     CityWithZonesResponse,
     HealthResponse,
     CoordinateValidation,
-    CoordinateResponse
+    CoordinateResponse,
+    CITY_LIST_ADAPTER,
+    ZONE_WITH_CITY_LIST_ADAPTER
 )
-from ..utils import get_current_user
+from ..utils import get_current_user, get_zone_loader, ZoneLoader
 from ..config import settings
 
 router = APIRouter()
 
+# Configuración usada en cada solicitud, leída una sola vez al importar
+APP_NAME = settings.APP_NAME
+APP_VERSION = settings.APP_VERSION
+DEFAULT_COUNTRY = settings.DEFAULT_COUNTRY
+
+# Consulta del health check construida una sola vez (cacheable por SQLAlchemy)
+HEALTH_CHECK_QUERY = select(literal(1))
+
+# Caché en memoria del listado de ciudades (cambian muy poco)
+# Clave: (skip, limit, is_active). Se invalida al crear o actualizar ciudades.
+cities_cache = TTLCache(maxsize=32, ttl=settings.CITIES_CACHE_TTL)
+
+# Último resultado exitoso del health check (evita un SELECT por cada sonda)
+health_cache = TTLCache(maxsize=1, ttl=settings.HEALTH_CACHE_TTL)
+
+# Columnas cargadas en los listados: solo las expuestas en las respuestas
+CITY_LIST_COLUMNS = load_only(*(getattr(City, field) for field in CityResponse.model_fields))
+ZONE_LIST_COLUMNS = (
+    load_only(*(getattr(Zone, field) for field in ZoneResponse.model_fields)),
+    load_only(City.name, City.country),
+)
+
+# Filas leídas y enviadas por bloque en los listados en streaming
+STREAM_BATCH_SIZE = 100
+
+
+async def iter_json_array(arrays: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """
+    Une arreglos JSON parciales en un único arreglo, de forma incremental
+    
+    Args:
+        arrays: Bloques serializados como arreglos JSON
+        
+    Yields:
+        bytes: Fragmentos del arreglo JSON
+    """
+    yield b"["
+    separator = b""
+    async for array in arrays:
+        if array == b"[]":
+            continue
+        yield separator + array[1:-1]
+        separator = b","
+    yield b"]"
+
 
 # ========== HEALTH CHECK ==========
 
@@ -36,18 +87,22 @@ router = APIRouter()
     description="Verifica el estado del servicio y la conexión a base de datos",
     tags=["Health"]
 )
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_db)):
     """Health check del microservicio"""
-    try:
-        db.execute(text("SELECT 1"))
-        database_status = "connected"
-    except Exception as e:
-        database_status = f"error: {str(e)}"
+    database_status = health_cache.get("database")
+    
+    if database_status is None:
+        try:
+            await db.execute(HEALTH_CHECK_QUERY)
+            database_status = "connected"
+            health_cache["database"] = database_status
+        except Exception as e:
+            database_status = f"error: {str(e)}"
     
     return HealthResponse(
         status="healthy" if database_status == "connected" else "unhealthy",
-        service=settings.APP_NAME,
-        version=settings.APP_VERSION,
+        service=APP_NAME,
+        version=APP_VERSION,
         database=database_status
     )
 
@@ -65,7 +120,7 @@ async def get_cities(
     skip: int = Query(0, ge=0, description="Registros a omitir"),
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros"),
     is_active: Optional[bool] = Query(None, description="Filtrar por estado activo"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     HU1: Como administrador, quiero ver las ciudades disponibles
@@ -73,13 +128,22 @@ async def get_cities(
     Returns:
         List[CityResponse]: Lista de ciudades
     """
-    query = db.query(City)
+    cache_key = (skip, limit, is_active)
+    content = cities_cache.get(cache_key)
     
-    if is_active is not None:
-        query = query.filter(City.is_active == is_active)
+    if content is None:
+        query = select(City).options(CITY_LIST_COLUMNS)
+        
+        if is_active is not None:
+            query = query.where(City.is_active == is_active)
+        
+        result = await db.execute(query.offset(skip).limit(limit))
+        cities = CITY_LIST_ADAPTER.validate_python(result.scalars().all())
+        content = CITY_LIST_ADAPTER.dump_python(cities, mode="json")
+        cities_cache[cache_key] = content
     
-    cities = query.offset(skip).limit(limit).all()
-    return cities
+    # Respuesta serializada una sola vez (sin revalidar contra response_model)
+    return ORJSONResponse(content=content)
 
 
 @router.get(
@@ -91,7 +155,7 @@ async def get_cities(
 )
 async def get_city_with_zones(
     city_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     HU1: Como administrador, quiero seleccionar una ciudad y ver sus zonas
@@ -105,7 +169,13 @@ async def get_city_with_zones(
     Raises:
         HTTPException: Si la ciudad no existe
     """
-    city = db.query(City).filter(City.id == city_id).first()
+    # Cargar la ciudad junto con sus zonas activas (sin N+1)
+    result = await db.execute(
+        select(City).options(
+            selectinload(City.zones.and_(Zone.is_active == True))
+        ).where(City.id == city_id)
+    )
+    city = result.scalars().first()
     
     if not city:
         raise HTTPException(
@@ -113,17 +183,13 @@ async def get_city_with_zones(
             detail=f"Ciudad con ID {city_id} no encontrada"
         )
     
-    # Obtener zonas activas de la ciudad
-    zones = db.query(Zone).filter(
-        Zone.city_id == city_id,
-        Zone.is_active == True
-    ).all()
-    
-    return CityWithZonesResponse(
-        **city.__dict__,
-        zones=[ZoneResponse.model_validate(z) for z in zones],
-        total_zones=len(zones)
+    response = CityWithZonesResponse(
+        **CityResponse.model_validate(city).model_dump(),
+        zones=city.zones,
+        total_zones=len(city.zones)
     )
+    
+    return ORJSONResponse(content=response.model_dump(mode="json"))
 
 
 @router.post(
@@ -136,7 +202,7 @@ async def get_city_with_zones(
 )
 async def create_city(
     city_data: CityCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -153,19 +219,23 @@ async def create_city(
     Raises:
         HTTPException: Si la ciudad ya existe
     """
-    # Verificar que no exista
-    existing = db.query(City).filter(City.name == city_data.name).first()
-    if existing:
+    # Crear nueva ciudad; si ya existe el INSERT no devuelve filas
+    result = await db.execute(
+        pg_insert(City)
+        .values(**city_data.model_dump())
+        .on_conflict_do_nothing(index_elements=[City.name])
+        .returning(City)
+    )
+    new_city = result.scalars().first()
+    
+    if new_city is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"La ciudad '{city_data.name}' ya existe"
         )
     
-    # Crear nueva ciudad
-    new_city = City(**city_data.model_dump())
-    db.add(new_city)
-    db.commit()
-    db.refresh(new_city)
+    await db.commit()
+    cities_cache.clear()
     
     return new_city
 
@@ -180,7 +250,7 @@ async def create_city(
 async def update_city(
     city_id: int,
     city_data: CityUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -198,7 +268,7 @@ async def update_city(
     Raises:
         HTTPException: Si la ciudad no existe
     """
-    city = db.query(City).filter(City.id == city_id).first()
+    city = await db.get(City, city_id)
     
     if not city:
         raise HTTPException(
@@ -211,8 +281,8 @@ async def update_city(
     for field, value in update_data.items():
         setattr(city, field, value)
     
-    db.commit()
-    db.refresh(city)
+    await db.commit()
+    cities_cache.clear()
     
     return city
 
@@ -231,7 +301,7 @@ async def get_zones(
     skip: int = Query(0, ge=0, description="Registros a omitir"),
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros"),
     is_active: Optional[bool] = Query(None, description="Filtrar por estado activo"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     HU1: Como administrador, quiero ver las zonas disponibles
@@ -239,27 +309,28 @@ async def get_zones(
     Returns:
         List[ZoneWithCityResponse]: Lista de zonas con información de ciudad
     """
-    query = db.query(Zone, City).join(City, Zone.city_id == City.id)
+    query = select(Zone, City).join(
+        City, Zone.city_id == City.id
+    ).options(*ZONE_LIST_COLUMNS)
     
     if city_id is not None:
-        query = query.filter(Zone.city_id == city_id)
+        query = query.where(Zone.city_id == city_id)
     
     if is_active is not None:
-        query = query.filter(Zone.is_active == is_active)
+        query = query.where(Zone.is_active == is_active)
     
-    zones = query.offset(skip).limit(limit).all()
+    zones = await db.stream(
+        query.offset(skip).limit(limit).execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
     
-    # Construir respuesta con información de ciudad
-    result = []
-    for zone, city in zones:
-        zone_dict = {
-            **zone.__dict__,
-            "city_name": city.name,
-            "city_country": city.country
-        }
-        result.append(ZoneWithCityResponse(**zone_dict))
+    # Construir respuesta con información de ciudad, por bloques de filas
+    # (la sesión de get_db sigue abierta hasta terminar el streaming)
+    async def zone_batches():
+        async for rows in zones.partitions():
+            batch = [ZoneWithCityResponse.from_zone(zone, city) for zone, city in rows]
+            yield ZONE_WITH_CITY_LIST_ADAPTER.dump_json(batch)
     
-    return result
+    return StreamingResponse(iter_json_array(zone_batches()), media_type="application/json")
 
 
 @router.get(
@@ -271,7 +342,7 @@ async def get_zones(
 )
 async def get_zone(
     zone_id: int,
-    db: Session = Depends(get_db)
+    loader: ZoneLoader = Depends(get_zone_loader)
 ):
     """
     Obtiene una zona por su ID
@@ -285,23 +356,16 @@ async def get_zone(
     Raises:
         HTTPException: Si la zona no existe
     """
-    zone, city = db.query(Zone, City).join(
-        City, Zone.city_id == City.id
-    ).filter(Zone.id == zone_id).first() or (None, None)
+    # Las solicitudes concurrentes se agrupan en una sola consulta
+    zone = await loader.load(zone_id)
     
-    if not zone:
+    if zone is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Zona con ID {zone_id} no encontrada"
         )
     
-    zone_dict = {
-        **zone.__dict__,
-        "city_name": city.name,
-        "city_country": city.country
-    }
-    
-    return ZoneWithCityResponse(**zone_dict)
+    return ORJSONResponse(content=zone)
 
 
 @router.post(
@@ -314,7 +378,7 @@ async def get_zone(
 )
 async def create_zone(
     zone_data: ZoneCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -332,30 +396,41 @@ async def create_zone(
         HTTPException: Si la ciudad no existe o la zona ya existe
     """
     # Verificar que la ciudad existe
-    city = db.query(City).filter(City.id == zone_data.city_id).first()
+    city = await db.get(City, zone_data.city_id)
     if not city:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Ciudad con ID {zone_data.city_id} no encontrada"
         )
     
-    # Verificar que no exista la misma zona en la ciudad
-    existing = db.query(Zone).filter(
-        Zone.name == zone_data.name,
-        Zone.city_id == zone_data.city_id
-    ).first()
+    # Verificar que la zona no existe en la ciudad
+    # (no depende de que ix_zones_city_name exista en la base de datos)
+    existing_zone = await db.scalar(
+        select(Zone.id).where(
+            Zone.city_id == zone_data.city_id,
+            Zone.name == zone_data.name
+        ).limit(1)
+    )
+    
+    new_zone = None
+    if existing_zone is None:
+        # Sin conflict target: con el índice único cubre inserciones concurrentes,
+        # sin él no exige ninguna restricción (ver migrations/001_geo_indexes.sql)
+        result = await db.execute(
+            pg_insert(Zone)
+            .values(**zone_data.model_dump())
+            .on_conflict_do_nothing()
+            .returning(Zone)
+        )
+        new_zone = result.scalars().first()
     
-    if existing:
+    if new_zone is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"La zona '{zone_data.name}' ya existe en {city.name}"
         )
     
-    # Crear nueva zona
-    new_zone = Zone(**zone_data.model_dump())
-    db.add(new_zone)
-    db.commit()
-    db.refresh(new_zone)
+    await db.commit()
     
     return new_zone
 
@@ -370,7 +445,7 @@ async def create_zone(
 async def update_zone(
     zone_id: int,
     zone_data: ZoneUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -388,7 +463,7 @@ async def update_zone(
     Raises:
         HTTPException: Si la zona no existe
     """
-    zone = db.query(Zone).filter(Zone.id == zone_id).first()
+    zone = await db.get(Zone, zone_id)
     
     if not zone:
         raise HTTPException(
@@ -401,8 +476,7 @@ async def update_zone(
     for field, value in update_data.items():
         setattr(zone, field, value)
     
-    db.commit()
-    db.refresh(zone)
+    await db.commit()
     
     return zone
 
@@ -430,6 +504,6 @@ async def validate_coordinates(coordinates: CoordinateValidation):
         latitude=coordinates.latitude,
         longitude=coordinates.longitude,
         is_valid=True,
-        country=settings.DEFAULT_COUNTRY
+        country=DEFAULT_COUNTRY
     )
 
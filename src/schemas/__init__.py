@@ -12,7 +12,9 @@ from .geo import (
     CityWithZonesResponse,
     HealthResponse,
     CoordinateValidation,
-    CoordinateResponse
+    CoordinateResponse,
+    CITY_LIST_ADAPTER,
+    ZONE_WITH_CITY_LIST_ADAPTER
 )
 
 __all__ = [
@@ -26,6 +28,8 @@ __all__ = [
     "CityWithZonesResponse",
     "HealthResponse",
     "CoordinateValidation",
-    "CoordinateResponse"
+    "CoordinateResponse",
+    "CITY_LIST_ADAPTER",
+    "ZONE_WITH_CITY_LIST_ADAPTER"
 ]
 
@@ -1,7 +1,7 @@
 """
 Schemas Geográficos
 """
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, TypeAdapter, field_validator
 from typing import Optional, List
 from datetime import datetime
 
@@ -12,6 +12,9 @@ class CityBase(BaseModel):
     """Schema base de Ciudad"""
     name: str = Field(..., min_length=2, max_length=255, description="Nombre de la ciudad")
     country: str = Field(default="Colombia", max_length=100, description="País")
+    
+    class Config:
+        defer_build = True
 
 
 class CityCreate(CityBase):
@@ -32,6 +35,9 @@ class CityUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=2, max_length=255)
     country: Optional[str] = Field(None, max_length=100)
     is_active: Optional[bool] = None
+    
+    class Config:
+        defer_build = True
 
 
 class CityResponse(CityBase):
@@ -62,14 +68,13 @@ class ZoneBase(BaseModel):
     color: str = Field(default="#3498db", pattern=r"^#[0-9A-Fa-f]{6}$", description="Color en formato hexadecimal")
     description: Optional[str] = Field(None, description="Descripción de la zona")
     
-    @field_validator('color')
+    class Config:
+        defer_build = True
+    
+    @field_validator('color', mode='after')
     @classmethod
-    def validate_color(cls, v):
-        """Valida que el color sea hexadecimal válido"""
-        if not v.startswith('#'):
-            raise ValueError('El color debe comenzar con #')
-        if len(v) != 7:
-            raise ValueError('El color debe tener formato #RRGGBB')
+    def normalize_color(cls, v):
+        """Normaliza el color a mayúsculas (el formato lo valida el pattern)"""
         return v.upper()
 
 
@@ -94,6 +99,9 @@ class ZoneUpdate(BaseModel):
     color: Optional[str] = Field(None, pattern=r"^#[0-9A-Fa-f]{6}$")
     description: Optional[str] = None
     is_active: Optional[bool] = None
+    
+    class Config:
+        defer_build = True
 
 
 class ZoneResponse(ZoneBase):
@@ -117,6 +125,10 @@ class ZoneResponse(ZoneBase):
         }
 
 
+# Campos de zona expuestos en las respuestas
+ZONE_RESPONSE_FIELDS = tuple(ZoneResponse.model_fields)
+
+
 class ZoneWithCityResponse(ZoneResponse):
     """Schema de zona con información de ciudad"""
     city_name: str = Field(..., description="Nombre de la ciudad")
@@ -136,6 +148,20 @@ class ZoneWithCityResponse(ZoneResponse):
                 "city_country": "Colombia"
             }
         }
+    
+    @classmethod
+    def from_zone(cls, zone, city) -> "ZoneWithCityResponse":
+        """
+        Construye la respuesta a partir de una zona y su ciudad (modelos ORM)
+        
+        Copia solo los campos de ZoneResponse en lugar de ``zone.__dict__``,
+        que arrastra el estado interno de SQLAlchemy
+        """
+        return cls(
+            **{field: getattr(zone, field) for field in ZONE_RESPONSE_FIELDS},
+            city_name=city.name,
+            city_country=city.country
+        )
 
 
 class CityWithZonesResponse(CityResponse):
@@ -167,32 +193,24 @@ class CityWithZonesResponse(CityResponse):
         }
 
 
+# ========== LIST ADAPTERS ==========
+
+# Validadores/serializadores de listas construidos una sola vez al importar
+CITY_LIST_ADAPTER = TypeAdapter(List[CityResponse])
+ZONE_WITH_CITY_LIST_ADAPTER = TypeAdapter(List[ZoneWithCityResponse])
+
+
 # ========== COORDINATE SCHEMAS ==========
 
 class CoordinateValidation(BaseModel):
     """Schema para validar coordenadas geográficas"""
-    latitude: float = Field(..., ge=-90, le=90, description="Latitud (-90 a 90)")
-    longitude: float = Field(..., ge=-180, le=180, description="Longitud (-180 a 180)")
-    
-    @field_validator('latitude')
-    @classmethod
-    def validate_latitude_colombia(cls, v):
-        """Valida que la latitud esté dentro del rango de Colombia"""
-        # Colombia: aproximadamente entre -4.23 y 12.46 de latitud
-        if not (-5 <= v <= 13):
-            raise ValueError('La latitud debe estar entre -5 y 13 (rango de Colombia)')
-        return v
-    
-    @field_validator('longitude')
-    @classmethod
-    def validate_longitude_colombia(cls, v):
-        """Valida que la longitud esté dentro del rango de Colombia"""
-        # Colombia: aproximadamente entre -79.00 y -66.85 de longitud
-        if not (-80 <= v <= -66):
-            raise ValueError('La longitud debe estar entre -80 y -66 (rango de Colombia)')
-        return v
+    # Colombia: aproximadamente entre -4.23 y 12.46 de latitud
+    latitude: float = Field(..., ge=-5, le=13, description="Latitud (-5 a 13, rango de Colombia)")
+    # Colombia: aproximadamente entre -79.00 y -66.85 de longitud
+    longitude: float = Field(..., ge=-80, le=-66, description="Longitud (-80 a -66, rango de Colombia)")
     
     class Config:
+        defer_build = True
         json_schema_extra = {
             "example": {
                 "latitude": 4.6097100,
@@ -227,6 +245,7 @@ class HealthResponse(BaseModel):
     database: str = Field(..., description="Estado de la base de datos")
     
     class Config:
+        defer_build = True
         json_schema_extra = {
             "example": {
                 "status": "healthy",
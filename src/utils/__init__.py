@@ -2,6 +2,6 @@
 Utilidades del microservicio
 """
 from .auth import get_current_user
+from .loaders import ZoneLoader, get_zone_loader
 
-__all__ = ["get_current_user"]
-
+__all__ = ["get_current_user", "ZoneLoader", "get_zone_loader"]
@@ -0,0 +1,111 @@
+"""
+Cargadores por lotes (estilo DataLoader)
+Agrupan consultas concurrentes por ID en una sola consulta IN
+"""
+import asyncio
+from typing import AsyncContextManager, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import City, SessionLocal, Zone
+from ..schemas import ZoneWithCityResponse
+
+
+class ZoneLoader:
+    """
+    Agrupa las búsquedas de zonas por ID que llegan dentro de una ventana
+    de tiempo y las resuelve con una única consulta ``WHERE id IN (...)``
+
+    Cada lote abre su propia sesión: las solicitudes agrupadas no comparten
+    la sesión ni la transacción de ninguna de ellas.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncContextManager[AsyncSession]] = SessionLocal,
+        batch_window: float = 0.005
+    ):
+        self.session_factory = session_factory
+        self.batch_window = batch_window
+        self._pending: Dict[int, List[asyncio.Future]] = {}
+        self._dispatch_task: Optional[asyncio.Task] = None
+
+    async def load(self, zone_id: int) -> Optional[dict]:
+        """
+        Obtiene una zona con información de su ciudad
+
+        Args:
+            zone_id: ID de la zona
+
+        Returns:
+            Optional[dict]: Zona serializada (ZoneWithCityResponse) o None si no existe
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(zone_id, []).append(future)
+
+        if self._dispatch_task is None:
+            self._dispatch_task = asyncio.create_task(self._dispatch())
+
+        return await future
+
+    def _take_pending(self) -> Dict[int, List[asyncio.Future]]:
+        """Cierra el lote actual; las siguientes solicitudes inician uno nuevo"""
+        pending, self._pending = self._pending, {}
+        self._dispatch_task = None
+        return pending
+
+    async def _dispatch(self) -> None:
+        """Ejecuta la consulta del lote y resuelve las solicitudes pendientes"""
+        pending: Dict[int, List[asyncio.Future]] = {}
+        found: Optional[Dict[int, dict]] = None
+        error: Optional[Exception] = None
+
+        try:
+            await asyncio.sleep(self.batch_window)
+            pending = self._take_pending()
+
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    select(Zone, City).join(
+                        City, Zone.city_id == City.id
+                    ).where(Zone.id.in_(list(pending)))
+                )
+                rows = result.all()
+
+            found = {
+                zone.id: ZoneWithCityResponse.from_zone(zone, city).model_dump(mode="json")
+                for zone, city in rows
+            }
+        except Exception as e:
+            error = e
+        finally:
+            # Cancelado antes de cerrar el lote: tomar las solicitudes acumuladas
+            if self._dispatch_task is asyncio.current_task():
+                pending = self._take_pending()
+
+            # Ninguna solicitud queda esperando: resultado, error o cancelación
+            for zone_id, futures in pending.items():
+                for future in futures:
+                    if future.done():
+                        continue
+                    if found is not None:
+                        future.set_result(found.get(zone_id))
+                    elif error is not None:
+                        future.set_exception(error)
+                    else:
+                        future.cancel()
+
+
+# Instancia compartida por todas las solicitudes del proceso
+zone_loader = ZoneLoader()
+
+
+def get_zone_loader() -> ZoneLoader:
+    """
+    Dependency para obtener el cargador de zonas
+
+    Returns:
+        ZoneLoader: Cargador compartido
+    """
+    return zone_loader
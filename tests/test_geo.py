@@ -1,71 +1,194 @@
 """
 Tests para el microservicio MS-GEO-PY
 """
+import asyncio
+import json
+import os
+import sqlite3
+from contextlib import nullcontext
+from datetime import datetime
+from operator import itemgetter
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from httpx import ASGITransport, AsyncClient
+from pydantic import ValidationError
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from src.main import app
 from src.models import Base, get_db, City, Zone
+from src.schemas import ZoneCreate, CoordinateValidation
+from src.routers.geo import cities_cache, health_cache, iter_json_array
+from src.utils import ZoneLoader, get_current_user, get_zone_loader
+
+# Datos válidos de zona para los tests de schemas
+VALID_ZONE = {"name": "Test", "city_id": 1, "color": "#3498DB"}
+
+# Cuerpos de validación de coordenadas ya serializados
+JSON_HEADERS = {"content-type": "application/json"}
+VALID_COORDS = b'{"latitude":4.60971,"longitude":-74.08175}'
+NEW_YORK_COORDS = b'{"latitude":40.7128,"longitude":-74.006}'
+BAD_LAT_COORDS = b'{"latitude":100,"longitude":-74.0}'
+BAD_LON_COORDS = b'{"latitude":4.6,"longitude":-200}'
+
+# Datos sembrados y respuestas esperadas de la API
+SEED_CREATED_AT = datetime(2025, 10, 2)
+
+EXPECTED_CITIES = [
+    {"id": 1, "name": "Bogotá", "country": "Colombia", "is_active": True, "created_at": "2025-10-02T00:00:00"},
+    {"id": 2, "name": "Medellín", "country": "Colombia", "is_active": True, "created_at": "2025-10-02T00:00:00"},
+]
+
+EXPECTED_ZONES = [
+    {"id": 1, "name": "Norte", "city_id": 1, "color": "#E74C3C", "description": "Zona norte", "is_active": True, "created_at": "2025-10-02T00:00:00"},
+    {"id": 2, "name": "Centro", "city_id": 1, "color": "#F39C12", "description": "Zona centro", "is_active": True, "created_at": "2025-10-02T00:00:00"},
+    {"id": 3, "name": "Sur", "city_id": 1, "color": "#27AE60", "description": "Zona sur", "is_active": True, "created_at": "2025-10-02T00:00:00"},
+]
 
-# Base de datos en memoria para tests
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+EXPECTED_ZONES_WITH_CITY = [
+    {**zone, "city_name": "Bogotá", "city_country": "Colombia"} for zone in EXPECTED_ZONES
+]
 
-engine = create_engine(
+# Base de datos en memoria para tests, compartida entre conexiones (shared cache)
+# Con pytest-xdist cada worker usa su propia base de datos
+XDIST_WORKER = os.environ.get("PYTEST_XDIST_WORKER", "main")
+SQLITE_URI = f"file:geo_test_{XDIST_WORKER}?mode=memory&cache=shared"
+SQLALCHEMY_DATABASE_URL = f"sqlite+aiosqlite:///{SQLITE_URI}&uri=true"
+
+# Conexión centinela: la base de datos en memoria existe mientras haya una conexión abierta
+sentinel_connection = sqlite3.connect(SQLITE_URI, uri=True, check_same_thread=False)
+
+engine = create_async_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
+    poolclass=AsyncAdaptedQueuePool,
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestSessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def disable_driver_transactions(dbapi_connection, connection_record):
+    """Dejar que SQLAlchemy emita BEGIN (necesario para SAVEPOINT en SQLite)"""
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def apply_fast_pragmas(dbapi_connection, connection_record):
+    """PRAGMAs de SQLite para tests: sin journal en disco ni sincronización"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=MEMORY")
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA locking_mode=EXCLUSIVE")
+    cursor.close()
 
 
-def override_get_db():
-    """Override de la dependency get_db para tests"""
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
+@event.listens_for(engine.sync_engine, "begin")
+def emit_begin(conn):
+    """Iniciar la transacción explícitamente"""
+    conn.exec_driver_sql("BEGIN")
 
 
-app.dependency_overrides[get_db] = override_get_db
 
-client = TestClient(app)
+async def seed_database():
+    """Crear tablas y datos de prueba (una vez por sesión de pytest)"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(City.__table__.insert(), [
+            {**city, "created_at": SEED_CREATED_AT} for city in EXPECTED_CITIES
+        ])
+        await conn.execute(Zone.__table__.insert(), [
+            {**zone, "created_at": SEED_CREATED_AT} for zone in EXPECTED_ZONES
+        ])
 
 
-@pytest.fixture(autouse=True)
-def setup_database():
-    """Configurar base de datos para cada test"""
-    Base.metadata.create_all(bind=engine)
+async def begin_test_transaction():
+    """Abrir una conexión con una transacción externa para un test"""
+    connection = await engine.connect()
+    transaction = await connection.begin()
+    return connection, transaction
+
+
+async def rollback_test_transaction(session, connection, transaction):
+    """Revertir todo lo escrito durante un test"""
+    await session.close()
+    await transaction.rollback()
+    await connection.close()
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    """Event loop compartido por todos los tests asíncronos"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Cliente HTTP compartido; el lifespan de la app se ejecuta una sola vez"""
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def seeded_db():
+    """Crear el schema y los datos de prueba una sola vez (solo si algún test los usa)"""
+    asyncio.run(seed_database())
+
+
+@pytest.fixture
+def db_session(seeded_db):
+    """
+    Sesión de cada test dentro de una transacción externa
     
-    # Crear datos de prueba
-    db = TestingSessionLocal()
+    Los commit de los endpoints liberan un SAVEPOINT; al terminar el test
+    la transacción externa se revierte y los datos sembrados quedan intactos.
+    Todas las solicitudes del test reutilizan esta sesión; el override de
+    get_db se retira al terminar para no afectar a otros tests.
+    """
+    connection, transaction = asyncio.run(begin_test_transaction())
+    session = AsyncSession(
+        bind=connection,
+        join_transaction_mode="create_savepoint",
+        autoflush=False,
+        expire_on_commit=False
+    )
     
-    # Crear ciudades
-    city1 = City(name="Bogotá", country="Colombia", is_active=True)
-    city2 = City(name="Medellín", country="Colombia", is_active=True)
-    db.add_all([city1, city2])
-    db.commit()
+    async def override_get_db():
+        yield session
     
-    # Crear zonas
-    zone1 = Zone(name="Norte", city_id=1, color="#E74C3C", description="Zona norte", is_active=True)
-    zone2 = Zone(name="Centro", city_id=1, color="#F39C12", description="Zona centro", is_active=True)
-    zone3 = Zone(name="Sur", city_id=1, color="#27AE60", description="Zona sur", is_active=True)
-    db.add_all([zone1, zone2, zone3])
-    db.commit()
-    db.close()
+    app.dependency_overrides[get_db] = override_get_db
+    # El cargador de zonas consulta con la misma sesión, sin cerrarla
+    test_zone_loader = ZoneLoader(session_factory=lambda: nullcontext(session))
+    app.dependency_overrides[get_zone_loader] = lambda: test_zone_loader
     
-    yield
+    yield session
     
-    Base.metadata.drop_all(bind=engine)
+    del app.dependency_overrides[get_db]
+    del app.dependency_overrides[get_zone_loader]
+    asyncio.run(rollback_test_transaction(session, connection, transaction))
+    cities_cache.clear()
+    health_cache.clear()
 
 
+@pytest.fixture
+def admin_user():
+    """Usuario autenticado para los endpoints protegidos"""
+    app.dependency_overrides[get_current_user] = lambda: {"email": "admin@test.com", "role": "admin"}
+    yield
+    del app.dependency_overrides[get_current_user]
+
+
+@pytest.mark.http
 class TestHealth:
     """Tests de health check"""
     
-    def test_health_check(self):
+    @pytest.mark.db
+    @pytest.mark.usefixtures("db_session")
+    def test_health_check(self, client):
         """Test del health check"""
         response = client.get("/api/v1/geo/health")
         assert response.status_code == 200
@@ -74,51 +197,111 @@ class TestHealth:
         assert "service" in data
         assert "version" in data
     
-    def test_root_redirect(self):
+    @pytest.mark.db
+    @pytest.mark.usefixtures("db_session")
+    def test_health_check_cached(self, client):
+        """Test de reutilización del último health check exitoso"""
+        statements = []
+        
+        def count_statement(conn, cursor, statement, *args):
+            if statement.startswith("SELECT"):
+                statements.append(statement)
+        
+        event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+        try:
+            for _ in range(3):
+                assert client.get("/api/v1/geo/health").json()["database"] == "connected"
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+        
+        assert len(statements) == 1
+    
+    def test_root_redirect(self, client):
         """Test de redirección de raíz"""
         response = client.get("/", follow_redirects=False)
         assert response.status_code == 307
         assert response.headers["location"] == "/docs"
 
 
+@pytest.mark.http
+@pytest.mark.db
+@pytest.mark.usefixtures("db_session")
 class TestCities:
     """Tests de ciudades"""
     
-    def test_get_cities(self):
-        """Test de listar ciudades"""
-        response = client.get("/api/v1/geo/cities")
-        assert response.status_code == 200
-        data = response.json()
-        assert isinstance(data, list)
-        assert len(data) >= 2
-        assert data[0]["name"] == "Bogotá"
+    @pytest.mark.asyncio
+    async def test_cities_matrix(self):
+        """Test de listar ciudades con filtros y paginación (solicitudes concurrentes)"""
+        # Una AsyncSession no admite operaciones concurrentes: una sesión por solicitud
+        async def concurrent_get_db():
+            async with TestSessionLocal() as session:
+                yield session
+        
+        app.dependency_overrides[get_db] = concurrent_get_db
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            responses = await asyncio.gather(
+                ac.get("/api/v1/geo/cities"),
+                ac.get("/api/v1/geo/cities?skip=0&limit=1"),
+                ac.get("/api/v1/geo/cities?is_active=true"),
+                ac.get("/api/v1/geo/cities?is_active=false"),
+            )
+        
+        assert [response.status_code for response in responses] == [200] * 4
+        assert [response.json() for response in responses] == [
+            EXPECTED_CITIES,
+            EXPECTED_CITIES[:1],
+            EXPECTED_CITIES,
+            [],
+        ]
     
-    def test_get_cities_with_pagination(self):
-        """Test de listar ciudades con paginación"""
-        response = client.get("/api/v1/geo/cities?skip=0&limit=1")
-        assert response.status_code == 200
+    def test_get_cities_cached(self, client, db_session):
+        """Test de caché del listado de ciudades"""
+        first = client.get("/api/v1/geo/cities")
+        
+        # Una ciudad nueva no aparece mientras la caché esté vigente
+        db_session.add(City(name="Cali", country="Colombia", is_active=True))
+        asyncio.run(db_session.commit())
+        
+        second = client.get("/api/v1/geo/cities")
+        assert second.json() == first.json()
+        
+        cities_cache.clear()
+        third = client.get("/api/v1/geo/cities")
+        assert len(third.json()) == len(first.json()) + 1
+    
+    def test_create_city(self, client, admin_user):
+        """Test de crear ciudad y rechazar duplicados"""
+        response = client.post("/api/v1/geo/cities", json={"name": "Cali"})
+        assert response.status_code == 201
         data = response.json()
-        assert len(data) == 1
+        assert data["name"] == "Cali"
+        assert data["is_active"] is True
+        
+        response = client.post("/api/v1/geo/cities", json={"name": "Bogotá"})
+        assert response.status_code == 400
     
-    def test_get_cities_filter_active(self):
-        """Test de filtrar ciudades activas"""
+    def test_update_city(self, client, admin_user):
+        """Test de actualizar ciudad"""
         response = client.get("/api/v1/geo/cities?is_active=true")
+        assert len(response.json()) == 2
+        
+        response = client.put("/api/v1/geo/cities/2", json={"is_active": False})
         assert response.status_code == 200
         data = response.json()
-        assert all(city["is_active"] for city in data)
+        assert data["name"] == "Medellín"
+        assert data["is_active"] is False
+        
+        # La actualización invalida el listado en caché
+        response = client.get("/api/v1/geo/cities?is_active=true")
+        assert [city["name"] for city in response.json()] == ["Bogotá"]
     
-    def test_get_city_with_zones(self):
+    def test_get_city_with_zones(self, client):
         """Test de obtener ciudad con zonas"""
         response = client.get("/api/v1/geo/cities/1")
         assert response.status_code == 200
-        data = response.json()
-        assert data["name"] == "Bogotá"
-        assert "zones" in data
-        assert "total_zones" in data
-        assert data["total_zones"] == 3
-        assert len(data["zones"]) == 3
+        assert response.json() == {**EXPECTED_CITIES[0], "zones": EXPECTED_ZONES, "total_zones": 3}
     
-    def test_get_city_not_found(self):
+    def test_get_city_not_found(self, client):
         """Test de ciudad no encontrada"""
         response = client.get("/api/v1/geo/cities/999")
         assert response.status_code == 404
@@ -126,127 +309,159 @@ class TestCities:
         assert "detail" in data
 
 
+@pytest.mark.http
+@pytest.mark.db
+@pytest.mark.usefixtures("db_session")
 class TestZones:
     """Tests de zonas"""
     
-    def test_get_zones(self):
-        """Test de listar zonas"""
-        response = client.get("/api/v1/geo/zones")
-        assert response.status_code == 200
-        data = response.json()
-        assert isinstance(data, list)
-        assert len(data) >= 3
-        assert "city_name" in data[0]
-        assert "city_country" in data[0]
-    
-    def test_get_zones_by_city(self):
-        """Test de filtrar zonas por ciudad"""
-        response = client.get("/api/v1/geo/zones?city_id=1")
+    @pytest.mark.parametrize("query,expected", [
+        ("", EXPECTED_ZONES_WITH_CITY),
+        ("?city_id=1", EXPECTED_ZONES_WITH_CITY),
+        ("?city_id=2", []),
+        ("?skip=0&limit=2", EXPECTED_ZONES_WITH_CITY[:2]),
+    ], ids=["all", "by_city", "empty_city", "pagination"])
+    def test_get_zones(self, client, query, expected):
+        """Test de listar zonas con filtros y paginación"""
+        response = client.get(f"/api/v1/geo/zones{query}")
         assert response.status_code == 200
-        data = response.json()
-        assert len(data) == 3
-        assert all(zone["city_id"] == 1 for zone in data)
+        # El listado no garantiza orden: comparar ordenado por ID
+        assert sorted(response.json(), key=itemgetter("id")) == expected
     
-    def test_get_zones_with_pagination(self):
-        """Test de listar zonas con paginación"""
-        response = client.get("/api/v1/geo/zones?skip=0&limit=2")
+    def test_get_zones_compressed(self, client):
+        """Test de compresión gzip del listado de zonas"""
+        response = client.get("/api/v1/geo/zones", headers={"Accept-Encoding": "gzip"})
         assert response.status_code == 200
-        data = response.json()
-        assert len(data) == 2
+        assert response.headers["content-encoding"] == "gzip"
+        assert len(response.json()) == 3
     
-    def test_get_zone_by_id(self):
+    def test_get_zone_by_id(self, client):
         """Test de obtener zona por ID"""
         response = client.get("/api/v1/geo/zones/1")
         assert response.status_code == 200
-        data = response.json()
-        assert data["name"] == "Norte"
-        assert data["city_name"] == "Bogotá"
-        assert data["color"] == "#E74C3C"
+        assert response.json() == EXPECTED_ZONES_WITH_CITY[0]
+    
+    def test_create_zone(self, client, admin_user):
+        """Test de crear zona y rechazar duplicados en la misma ciudad"""
+        response = client.post(
+            "/api/v1/geo/zones",
+            json={"name": "Occidente", "city_id": 1, "color": "#8e44ad"}
+        )
+        assert response.status_code == 201
+        assert response.json()["color"] == "#8E44AD"
+        
+        response = client.post("/api/v1/geo/zones", json={"name": "Norte", "city_id": 1})
+        assert response.status_code == 400
+        
+        response = client.post("/api/v1/geo/zones", json={"name": "Norte", "city_id": 2})
+        assert response.status_code == 201
+        
+        response = client.post("/api/v1/geo/zones", json={"name": "Norte", "city_id": 999})
+        assert response.status_code == 404
     
-    def test_get_zone_not_found(self):
+    def test_get_zone_not_found(self, client):
         """Test de zona no encontrada"""
         response = client.get("/api/v1/geo/zones/999")
         assert response.status_code == 404
+    
+    @pytest.mark.parametrize("batches", [[], [[]], [[0]], [[0, 1], [], [2]], [[0, 1], [2, 3]]])
+    def test_iter_json_array(self, batches):
+        """Test de unión incremental de arreglos JSON parciales"""
+        async def arrays():
+            for batch in batches:
+                yield json.dumps([{"id": i} for i in batch]).encode()
+        
+        async def collect():
+            return [chunk async for chunk in iter_json_array(arrays())]
+        
+        body = b"".join(asyncio.run(collect()))
+        assert json.loads(body) == [{"id": i} for batch in batches for i in batch]
+    
+    def test_zone_loader_batches_queries(self, db_session):
+        """Test de agrupación de búsquedas concurrentes en una consulta"""
+        statements = []
+        
+        def count_statement(conn, cursor, statement, *args):
+            if statement.startswith("SELECT"):
+                statements.append(statement)
+        
+        loader = ZoneLoader(session_factory=lambda: nullcontext(db_session))
+        
+        async def load_many():
+            return await asyncio.gather(
+                loader.load(1),
+                loader.load(2),
+                loader.load(999)
+            )
+        
+        event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+        try:
+            norte, centro, missing = asyncio.run(load_many())
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+        
+        assert len(statements) == 1
+        assert [norte, centro, missing] == [*EXPECTED_ZONES_WITH_CITY[:2], None]
+
+    def test_zone_loader_cancelled_dispatch(self):
+        """Test de que cancelar el lote no deja solicitudes esperando"""
+        loader = ZoneLoader(batch_window=10)
 
+        async def cancel_dispatch():
+            waiters = [asyncio.ensure_future(loader.load(zone_id)) for zone_id in (1, 2)]
+            await asyncio.sleep(0)
+            loader._dispatch_task.cancel()
+            return await asyncio.gather(*waiters, return_exceptions=True)
 
+        results = asyncio.run(cancel_dispatch())
+        assert all(isinstance(result, asyncio.CancelledError) for result in results)
+        assert loader._dispatch_task is None
+
+
+@pytest.mark.http
 class TestCoordinates:
     """Tests de coordenadas"""
     
-    def test_validate_coordinates_valid(self):
-        """Test de validar coordenadas válidas"""
-        response = client.post(
-            "/api/v1/geo/coordinates/validate",
-            json={
-                "latitude": 4.6097100,
-                "longitude": -74.0817500
-            }
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert data["is_valid"] is True
-        assert data["country"] == "Colombia"
-    
-    def test_validate_coordinates_out_of_colombia_range(self):
-        """Test de coordenadas fuera del rango de Colombia"""
-        response = client.post(
-            "/api/v1/geo/coordinates/validate",
-            json={
-                "latitude": 40.7128,  # Nueva York
-                "longitude": -74.0060
-            }
-        )
-        assert response.status_code == 422  # Validation error
-    
-    def test_validate_coordinates_invalid_latitude(self):
-        """Test de latitud inválida"""
-        response = client.post(
-            "/api/v1/geo/coordinates/validate",
-            json={
-                "latitude": 100,  # Fuera de rango
-                "longitude": -74.0
-            }
-        )
-        assert response.status_code == 422
-    
-    def test_validate_coordinates_invalid_longitude(self):
-        """Test de longitud inválida"""
+    @pytest.mark.parametrize("body,expected_status,expected_country", [
+        (VALID_COORDS, 200, "Colombia"),
+        (NEW_YORK_COORDS, 422, None),
+        (BAD_LAT_COORDS, 422, None),
+        (BAD_LON_COORDS, 422, None),
+    ], ids=["valid_bogota", "out_of_colombia", "bad_lat", "bad_lon"])
+    def test_validate_coordinates(self, client, body, expected_status, expected_country):
+        """Test de validación de coordenadas"""
         response = client.post(
             "/api/v1/geo/coordinates/validate",
-            json={
-                "latitude": 4.6,
-                "longitude": -200  # Fuera de rango
-            }
+            content=body,
+            headers=JSON_HEADERS
         )
-        assert response.status_code == 422
+        assert response.status_code == expected_status
+        if expected_country is not None:
+            data = response.json()
+            assert data["is_valid"] is True
+            assert data["country"] == expected_country
 
 
 class TestSchemas:
     """Tests de schemas y validación"""
     
-    def test_zone_color_validation(self):
+    @pytest.mark.parametrize("override,ok", [
+        ({}, True),
+        ({"color": "#3498db"}, True),
+        ({"color": "blue"}, False),
+        ({"color": "#ZZZZZZ"}, False),
+    ], ids=["valid", "lowercase", "not_hex", "bad_digits"])
+    def test_zone_color_validation(self, override, ok):
         """Test de validación de color hexadecimal"""
-        from src.schemas import ZoneCreate
-        
-        # Color válido
-        zone = ZoneCreate(
-            name="Test",
-            city_id=1,
-            color="#3498DB"
-        )
-        assert zone.color == "#3498DB"
-        
-        # Color inválido debe fallar
-        with pytest.raises(ValueError):
-            ZoneCreate(
-                name="Test",
-                city_id=1,
-                color="blue"  # No es hexadecimal
-            )
+        payload = {**VALID_ZONE, **override}
+        if ok:
+            assert ZoneCreate(**payload).color == payload["color"].upper()
+        else:
+            with pytest.raises(ValidationError, match="color"):
+                ZoneCreate(**payload)
     
     def test_coordinate_validation(self):
         """Test de validación de coordenadas"""
-        from src.schemas import CoordinateValidation
-        
         # Coordenadas válidas
         coords = CoordinateValidation(
             latitude=4.6097100,